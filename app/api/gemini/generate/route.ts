@@ -2,7 +2,7 @@ import { NextRequest, NextResponse } from 'next/server'
 import { GoogleGenerativeAI } from '@google/generative-ai'
 import { Employee, Schedule, ScheduleDay, Shift, BranchCode, Division } from '@/types'
 import { storage } from '@/lib/storage'
-import { generateId } from '@/lib/utils'
+import { generateId, createShift, toLocalDateString, DAY_NAMES, getAvailabilityMask } from '@/lib/utils'
 import { promises as fs } from 'fs'
 import path from 'path'
 
@@ -46,8 +46,6 @@ function computeQuincenaRange(startDate: string): { dateList: Array<{ date: stri
   const start = new Date(year, month - 1, day)
   const startDay = start.getDate()
 
-  const dayNames = ['Domingo', 'Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado']
-
   let numDays: number
   let end: Date
   if (startDay === 1) {
@@ -65,30 +63,146 @@ function computeQuincenaRange(startDate: string): { dateList: Array<{ date: stri
 
   const dateList: Array<{ date: string; dayName: string }> = []
   for (let i = 0; i < numDays; i++) {
-    const d = new Date(start)
-    d.setDate(start.getDate() + i)
-    const yyyy = d.getFullYear()
-    const mm = String(d.getMonth() + 1).padStart(2, '0')
-    const dd = String(d.getDate()).padStart(2, '0')
-    const date = `${yyyy}-${mm}-${dd}`
-    const dayName = dayNames[d.getDay()]
-    dateList.push({ date, dayName })
+    const d = new Date(year, month - 1, day + i)
+    dateList.push({ date: toLocalDateString(d), dayName: DAY_NAMES[d.getDay()] })
   }
 
-  const yyyy = end.getFullYear()
-  const mm = String(end.getMonth() + 1).padStart(2, '0')
-  const dd = String(end.getDate()).padStart(2, '0')
-  const endDate = `${yyyy}-${mm}-${dd}`
+  const endDate = toLocalDateString(end)
 
   return { dateList, endDate }
 }
 
+// Accepted spellings for each turn (English, Spanish and T1/T2/T3 codes)
+const LOOSE_TURN_KEYS = new Map<string, AssignmentTurn>([
+  ['morning', 'morning'], ['mañana', 'morning'], ['manana', 'morning'], ['t1', 'morning'], ['turno 1', 'morning'],
+  ['afternoon', 'afternoon'], ['tarde', 'afternoon'], ['t2', 'afternoon'], ['turno 2', 'afternoon'],
+  ['night', 'night'], ['noche', 'night'], ['t3', 'night'], ['turno 3', 'night'],
+])
+
 function mapLooseTurnToKey(turn: string): AssignmentTurn | null {
-  const t = (turn || '').toLowerCase().trim()
-  if (t === 'morning' || t === 'mañana' || t === 'manana' || t === 't1' || t === 'turno 1') return 'morning'
-  if (t === 'afternoon' || t === 'tarde' || t === 't2' || t === 'turno 2') return 'afternoon'
-  if (t === 'night' || t === 'noche' || t === 't3' || t === 'turno 3') return 'night'
-  return null
+  return LOOSE_TURN_KEYS.get((turn || '').toLowerCase().trim()) || null
+}
+
+const TURN_CODE: Record<AssignmentTurn, number> = { morning: 1, afternoon: 2, night: 3 }
+
+const ALL_WEEKDAYS_MASK = 0x7f
+
+// Every turn is 8 hours; cap each employee at 48 hours in any 7-day window
+const TURN_HOURS = 8
+const MAX_WEEKLY_HOURS = 48
+const MAX_TURNS_PER_WEEK = Math.floor(MAX_WEEKLY_HOURS / TURN_HOURS)
+
+type AssignmentConstraints = {
+  employeeIds: string[]
+  employeeIndex: Map<string, number>
+  // getAvailabilityMask of employee e: bit `weekday` is set when e can work that weekday
+  availability: Uint8Array
+  // TURN_CODE of the employee's assignedShift (0 = no preference)
+  preferredTurn: Uint8Array
+}
+
+/**
+ * Pack employee availability into one 7-bit mask per employee so each plan assignment
+ * is validated with a shift and AND instead of scanning availableDays strings.
+ * Employees without availability data are treated as available every day.
+ */
+function buildAssignmentConstraints(employees: Employee[]): AssignmentConstraints {
+  const employeeIds = employees.map((emp) => emp.id)
+  const employeeIndex = new Map<string, number>()
+  const availability = new Uint8Array(employees.length)
+  const preferredTurn = new Uint8Array(employees.length)
+
+  employees.forEach((emp, e) => {
+    employeeIndex.set(emp.id, e)
+    preferredTurn[e] = TURN_CODE[emp.assignedShift as AssignmentTurn] || 0
+    const availableDays = emp.availableDays || []
+    availability[e] = availableDays.length === 0 ? ALL_WEEKDAYS_MASK : getAvailabilityMask(availableDays)
+  })
+
+  return { employeeIds, employeeIndex, availability, preferredTurn }
+}
+
+type AssignmentState = {
+  numDays: number
+  // worked[e * numDays + dayNumber] === 1 when employee e has a turn that day
+  worked: Uint8Array
+  // night[e * numDays + dayNumber] === 1 when that turn is a night
+  night: Uint8Array
+  // Turns assigned to each employee so far, to spread open turns fairly
+  load: Int32Array
+}
+
+type TurnAssignment = { employeeId: string; position?: 'C1' | 'C2' | 'C3' | 'EXT' }
+
+// Position given to server-filled turns: branches 001/003 need a C1 on morning and afternoon, and nights have no C1
+const FILL_POSITION: Record<AssignmentTurn, 'C1' | 'C2'> = { morning: 'C1', afternoon: 'C1', night: 'C2' }
+
+/**
+ * Whether one more turn on dayNumber keeps employee e within MAX_TURNS_PER_WEEK in
+ * every 7-day window containing that day (windows on both sides, clipped to the range).
+ */
+function fitsWeeklyCap(state: AssignmentState, e: number, dayNumber: number): boolean {
+  const { numDays, worked } = state
+  const row = e * numDays
+  for (let windowStart = Math.max(0, dayNumber - 6); windowStart <= dayNumber; windowStart++) {
+    const windowEnd = Math.min(numDays - 1, windowStart + 6)
+    let turns = 0
+    for (let d = windowStart; d <= windowEnd; d++) turns += worked[row + d]
+    if (turns >= MAX_TURNS_PER_WEEK) return false
+  }
+  return true
+}
+
+/**
+ * Hard constraints shared by plan validation and open-turn filling: available that
+ * weekday, no other turn that day, and within the weekly hours cap.
+ */
+function canWorkTurn(constraints: AssignmentConstraints, state: AssignmentState, e: number, weekday: number, dayNumber: number): boolean {
+  if (!((constraints.availability[e] >> weekday) & 1)) return false
+  if (state.worked[e * state.numDays + dayNumber]) return false
+  return fitsWeeklyCap(state, e, dayNumber)
+}
+
+function recordTurn(state: AssignmentState, e: number, turn: AssignmentTurn, dayNumber: number): void {
+  state.worked[e * state.numDays + dayNumber] = 1
+  if (turn === 'night') state.night[e * state.numDays + dayNumber] = 1
+  state.load[e]++
+}
+
+/**
+ * Pick an employee for a turn the plan left open. Only employees that pass canWorkTurn
+ * (and, for nights, have no night the day before or after) are eligible; among those the
+ * lightest load so far wins, and the employee's usual turn only breaks ties.
+ * Returns -1 when nobody is eligible.
+ */
+function pickEmployeeForOpenTurn(
+  constraints: AssignmentConstraints,
+  state: AssignmentState,
+  turn: AssignmentTurn,
+  weekday: number,
+  dayNumber: number
+): number {
+  const { preferredTurn } = constraints
+  const { numDays, night } = state
+  const turnCode = TURN_CODE[turn]
+  let best = -1
+  let bestScore = Infinity
+
+  for (let e = 0; e < preferredTurn.length; e++) {
+    if (!canWorkTurn(constraints, state, e, weekday, dayNumber)) continue
+    // Avoid consecutive nights for the same person (same rule the prompt gives the model)
+    if (turn === 'night') {
+      const row = e * numDays
+      if ((dayNumber > 0 && night[row + dayNumber - 1]) || (dayNumber < numDays - 1 && night[row + dayNumber + 1])) continue
+    }
+    const score = state.load[e] * 2 + (preferredTurn[e] === turnCode ? 0 : 1)
+    if (score < bestScore) {
+      best = e
+      bestScore = score
+    }
+  }
+
+  return best
 }
 
 function buildScheduleFromPlan(
@@ -96,38 +210,65 @@ function buildScheduleFromPlan(
   startDate: string,
   endDate: string,
   plan: GeminiGeneratePlan,
-  validEmployeeIds: Set<string>,
+  constraints: AssignmentConstraints,
   branchCode?: BranchCode,
   division?: Division
 ): Schedule | null {
-  const days: ScheduleDay[] = []
   const planByDate = new Map<string, GeminiGeneratePlan['days'][number]>()
   for (const d of plan.days || []) {
     if (d && typeof d.date === 'string') planByDate.set(d.date, d)
   }
 
+  const { employeeIds, employeeIndex } = constraints
+
   // Build each day using the three standard turns
   const { dateList } = computeQuincenaRange(startDate)
-  for (const { date, dayName } of dateList) {
-    const dayAssignments = planByDate.get(date)?.assignments || []
+  // dateList names come from DAY_NAMES, so these are always valid 0-6 indexes
+  const weekdays = dateList.map(({ dayName }) => DAY_NAMES.indexOf(dayName))
+  const turnsByDay = dateList.map(() => new Map<AssignmentTurn, TurnAssignment>())
+  const state: AssignmentState = {
+    numDays: dateList.length,
+    worked: new Uint8Array(employeeIds.length * dateList.length),
+    night: new Uint8Array(employeeIds.length * dateList.length),
+    load: new Int32Array(employeeIds.length),
+  }
 
-    // Initialize map to track chosen employee per turn
-    const turnToEmployee = new Map<AssignmentTurn, { employeeId: string; position?: 'C1' | 'C2' | 'C3' | 'EXT' }>()
-    for (const a of dayAssignments) {
+  // Pass 1: place every valid plan assignment across the whole range before filling anything,
+  // so server-filled turns never push the model's own later assignments over the weekly cap
+  dateList.forEach(({ date }, dayNumber) => {
+    const turnToEmployee = turnsByDay[dayNumber]
+    for (const a of planByDate.get(date)?.assignments || []) {
       const key = mapLooseTurnToKey(String(a.turn))
-      if (!key) continue
-      if (!a.employeeId || !validEmployeeIds.has(a.employeeId)) continue
-      if (!turnToEmployee.has(key)) {
-        turnToEmployee.set(key, { employeeId: a.employeeId, position: a.position })
-      }
+      if (!key || turnToEmployee.has(key)) continue
+      const e = a.employeeId ? employeeIndex.get(a.employeeId) : undefined
+      if (e === undefined) continue
+      // Enforce availability, one turn per employee per day and the weekly hours cap
+      if (!canWorkTurn(constraints, state, e, weekdays[dayNumber], dayNumber)) continue
+      turnToEmployee.set(key, { employeeId: a.employeeId, position: a.position })
+      recordTurn(state, e, key, dayNumber)
     }
+  })
+
+  // Pass 2: fill turns the plan left open (or that failed validation); turns nobody can take stay empty.
+  // Branch 002 doesn't have night shift, so never fill one there
+  const fillableTurns: AssignmentTurn[] = branchCode === '002' ? ['morning', 'afternoon'] : ['morning', 'afternoon', 'night']
+  turnsByDay.forEach((turnToEmployee, dayNumber) => {
+    fillableTurns.forEach((turn) => {
+      if (turnToEmployee.has(turn)) return
+      const e = pickEmployeeForOpenTurn(constraints, state, turn, weekdays[dayNumber], dayNumber)
+      if (e === -1) return
+      turnToEmployee.set(turn, { employeeId: employeeIds[e], position: FILL_POSITION[turn] })
+      recordTurn(state, e, turn, dayNumber)
+    })
+  })
 
+  const days: ScheduleDay[] = dateList.map(({ date, dayName }, dayNumber) => {
+    const turnToEmployee = turnsByDay[dayNumber]
     const shifts: Shift[] = []
     ;(['morning', 'afternoon', 'night'] as const).forEach((turn) => {
       const chosen = turnToEmployee.get(turn as AssignmentTurn)
       const { start, end } = TURN_TO_TIME[turn as 'morning' | 'afternoon' | 'night']
-      shifts.push({
-        id: generateId(),
+      shifts.push(createShift({
         startTime: start,
         endTime: end,
         date,
@@ -135,11 +276,11 @@ function buildScheduleFromPlan(
         status: chosen ? 'assigned' : 'empty',
         employeeId: chosen?.employeeId,
         position: chosen?.position,
-      })
+      }))
     })
 
-    days.push({ date, dayName, shifts })
-  }
+    return { date, dayName, shifts }
+  })
 
   const schedule: Schedule = {
     id: generateId(),
@@ -206,7 +347,9 @@ export async function POST(req: NextRequest) {
 
     const { dateList, endDate } = computeQuincenaRange(body.startDate)
 
-    const employeesSlim = employees.slice(0, 200).map((e) => ({
+    // Only these employees are shown to the model; validation and gap filling use the same list
+    const promptEmployees = employees.slice(0, 200)
+    const employeesSlim = promptEmployees.map((e) => ({
       id: e.id,
       name: e.name,
       availableDays: e.availableDays,
@@ -282,7 +425,7 @@ export async function POST(req: NextRequest) {
       return NextResponse.json({ ok: false, error: 'bad_plan' }, { status: 200 })
     }
 
-    const validEmployeeIds = new Set(employees.map((e) => e.id))
+    const constraints = buildAssignmentConstraints(promptEmployees)
     const plan: GeminiGeneratePlan = { days: daysArr }
 
     const schedule = buildScheduleFromPlan(
@@ -290,7 +433,7 @@ export async function POST(req: NextRequest) {
       body.startDate,
       endDate,
       plan,
-      validEmployeeIds,
+      constraints,
       body.branchCode as BranchCode | undefined,
       body.division as Division | undefined,
     )
@@ -3,7 +3,7 @@
 import React, { useEffect, useMemo, useState } from 'react'
 import { BranchCode, Division, Employee, Schedule, Shift, ShiftStatus, ShiftType, PositionType } from '@/types'
 import { storage } from '@/lib/storage'
-import { generateWeeklySchedule, getDefaultShiftTemplates, getShiftTypeFromTime } from '@/lib/utils'
+import { generateWeeklySchedule, getDefaultShiftTemplates, getShiftTypeFromTime, buildEmployeeMap, createShift, DAY_NAMES } from '@/lib/utils'
 import { showLoading, closeAlert, showError, showSuccess, showConfirm } from '@/lib/sweetalert'
 import { recordScheduleCreationMeta } from '@/lib/tracking'
 
@@ -41,40 +41,40 @@ function datesEqualISO(a: Date, b: Date): boolean {
 }
 
 // Rotation mapping copied and generalized from GridView, adapted to default 07/15/23 times
+const EXT_SHIFT_ROTATION: Record<ShiftType, ShiftType> = {
+  morning: 'afternoon',
+  afternoon: 'night',
+  night: 'morning',
+  unassigned: 'unassigned'
+}
+
+const SHIFT_POSITION_ROTATION: Record<string, { shift: ShiftType; position: PositionType }> = {
+  // Morning rotations
+  'morning-C1': { shift: 'afternoon', position: 'C2' },
+  'morning-C2': { shift: 'afternoon', position: 'C3' },
+  'morning-C3': { shift: 'afternoon', position: 'C1' },
+  // Afternoon rotations (to night: no C1, use C2/C3)
+  'afternoon-C1': { shift: 'night', position: 'C2' },
+  'afternoon-C2': { shift: 'night', position: 'C3' },
+  'afternoon-C3': { shift: 'night', position: 'C2' },
+  // Night rotations (from night: C2↔C3, then to morning)
+  'night-C2': { shift: 'morning', position: 'C3' },
+  'night-C3': { shift: 'morning', position: 'C1' }
+}
+
 function rotateShiftAndPosition(currentShift: ShiftType, currentPosition: PositionType): { shift: ShiftType; position: PositionType } {
   if (currentPosition === 'EXT') {
-    const shiftRotation: Record<ShiftType, ShiftType> = {
-      morning: 'afternoon',
-      afternoon: 'night',
-      night: 'morning',
-      unassigned: 'unassigned'
-    }
-    return { shift: shiftRotation[currentShift], position: 'EXT' }
+    return { shift: EXT_SHIFT_ROTATION[currentShift], position: 'EXT' }
   }
 
-  const rotation: Record<string, { shift: ShiftType; position: PositionType }> = {
-    // Morning rotations
-    'morning-C1': { shift: 'afternoon', position: 'C2' },
-    'morning-C2': { shift: 'afternoon', position: 'C3' },
-    'morning-C3': { shift: 'afternoon', position: 'C1' },
-    // Afternoon rotations (to night: no C1, use C2/C3)
-    'afternoon-C1': { shift: 'night', position: 'C2' },
-    'afternoon-C2': { shift: 'night', position: 'C3' },
-    'afternoon-C3': { shift: 'night', position: 'C2' },
-    // Night rotations (from night: C2↔C3, then to morning)
-    'night-C2': { shift: 'morning', position: 'C3' },
-    'night-C3': { shift: 'morning', position: 'C1' }
-  }
-  const key = `${currentShift}-${currentPosition}`
-  return rotation[key] || { shift: currentShift, position: currentPosition }
+  const rotated = SHIFT_POSITION_ROTATION[`${currentShift}-${currentPosition}`]
+  return rotated ? { ...rotated } : { shift: currentShift, position: currentPosition }
 }
 
 function advanceRestDay(dayName: string): string {
-  const days = ['Domingo', 'Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado']
-  const currentIndex = days.indexOf(dayName)
+  const currentIndex = DAY_NAMES.indexOf(dayName)
   if (currentIndex === -1) return dayName
-  const nextIndex = (currentIndex + 1) % days.length
-  return days[nextIndex]
+  return DAY_NAMES[(currentIndex + 1) % DAY_NAMES.length]
 }
 
 const DEFAULT_SHIFT_TIMES: Record<ShiftType, { start: string; end: string }> = {
@@ -231,8 +231,7 @@ export default function CreateScheduleDialog({ isOpen, onClose, branchCode, divi
             const { shift: rotatedShift, position: rotatedPosition } = rotateShiftAndPosition(currentShiftType, currentPosition)
             const time = DEFAULT_SHIFT_TIMES[rotatedShift]
 
-            const newShift: Shift = {
-              id: crypto.randomUUID ? crypto.randomUUID() : Math.random().toString(36).slice(2),
+            const newShift: Shift = createShift({
               startTime: time.start,
               endTime: time.end,
               date: newDay.date,
@@ -241,12 +240,9 @@ export default function CreateScheduleDialog({ isOpen, onClose, branchCode, divi
               position: rotatedPosition,
               status: isRestDay
                 ? ('rest' as ShiftStatus)
-                : (prevShift.status === 'rest' ? 'assigned' : (prevShift.status || 'assigned'))
-            }
-
-            if (prevShift.coverageInfo && !isRestDay) {
-              newShift.coverageInfo = { ...prevShift.coverageInfo }
-            }
+                : (prevShift.status === 'rest' ? 'assigned' : (prevShift.status || 'assigned')),
+              coverageInfo: prevShift.coverageInfo && !isRestDay ? { ...prevShift.coverageInfo } : undefined
+            })
 
             newDay.shifts.push(newShift)
           })
@@ -261,12 +257,15 @@ export default function CreateScheduleDialog({ isOpen, onClose, branchCode, divi
           }
           return emp
         })
-        for (const emp of updatedEmployees) {
-          const original = allEmployees.find(e => e.id === emp.id)
-          if (original && emp.shiftRotationCount !== original.shiftRotationCount) {
-            await storage.updateEmployee(emp.id, { shiftRotationCount: emp.shiftRotationCount })
-          }
-        }
+        // Send the counter updates together instead of waiting on one round-trip per employee
+        const originalMap = buildEmployeeMap(allEmployees)
+        const changedEmployees = updatedEmployees.filter(emp => {
+          const original = originalMap.get(emp.id)
+          return original && emp.shiftRotationCount !== original.shiftRotationCount
+        })
+        await Promise.all(changedEmployees.map(emp =>
+          storage.updateEmployee(emp.id, { shiftRotationCount: emp.shiftRotationCount })
+        ))
 
         creationSource = 'rotation'
       } else {
@@ -1,9 +1,9 @@
 'use client'
 
 import { useState, useRef, useEffect, useMemo, useCallback, memo } from 'react'
-import { Employee, Schedule, ShiftStatus, ShiftType, CoverageInfo, PositionType, BranchCode, Division } from '@/types'
+import { Employee, Schedule, Shift, ShiftStatus, ShiftType, CoverageInfo, PositionType, BranchCode, Division } from '@/types'
 import { storage } from '@/lib/storage'
-import { formatTime, generateWeeklySchedule, getDefaultShiftTemplates, parseLocalDate, generateId, getShiftTypeFromTime } from '@/lib/utils'
+import { formatTime, generateWeeklySchedule, getDefaultShiftTemplates, parseLocalDate, getShiftTypeFromTime, buildEmployeeMap, createShift, escapeHtml, DAY_NAMES } from '@/lib/utils'
 import { exportToPDF, exportToCSV, importFromCSV, importAllSchedulesFromCSV } from '@/lib/exportUtils'
 import { Download, Plus, Upload, Calendar, FileSpreadsheet, MoreVertical } from 'lucide-react'
 import { DndProvider, useDrag, useDrop } from 'react-dnd'
@@ -43,6 +43,35 @@ const ItemTypes = {
   VACATION_CELL: 'vacation_cell'
 }
 
+// Rotation tables for "apply rotation from previous schedule"; built once instead of per shift
+const EXT_SHIFT_ROTATION: Record<ShiftType, ShiftType> = {
+  morning: 'afternoon',
+  afternoon: 'night',
+  night: 'morning',
+  unassigned: 'unassigned'
+}
+
+const SHIFT_POSITION_ROTATION: Record<string, { shift: ShiftType; position: PositionType }> = {
+  // Morning rotations
+  'morning-C1': { shift: 'afternoon', position: 'C2' },
+  'morning-C2': { shift: 'afternoon', position: 'C3' },
+  'morning-C3': { shift: 'afternoon', position: 'C1' },
+  // Afternoon rotations (to night: no C1, use C2/C3)
+  'afternoon-C1': { shift: 'night', position: 'C2' },
+  'afternoon-C2': { shift: 'night', position: 'C3' },
+  'afternoon-C3': { shift: 'night', position: 'C2' },
+  // Night rotations (from night: C2↔C3, then to morning)
+  'night-C2': { shift: 'morning', position: 'C3' },
+  'night-C3': { shift: 'morning', position: 'C1' }
+}
+
+const ROTATION_SHIFT_TIMES: Record<ShiftType, { start: string; end: string }> = {
+  morning: { start: '06:00', end: '14:00' },
+  afternoon: { start: '14:00', end: '22:00' },
+  night: { start: '22:00', end: '06:00' },
+  unassigned: { start: '', end: '' }
+}
+
 // Helper function to get coverage tooltip
 function getCoverageTooltip(coverageInfo?: CoverageInfo): string {
   if (!coverageInfo) return 'Cubriendo'
@@ -1111,6 +1140,8 @@ export default function GridView({ schedule, employees, onUpdate, branchCode, di
   const pendingUpdateRef = useRef<{ schedule: Schedule; status: ShiftStatus; employeeId: string; dayIndex: number; shiftType: ShiftType } | null>(null)
   const updateCounterRef = useRef<number>(0)
 
+  const employeeMap = useMemo(() => buildEmployeeMap(employees), [employees])
+
   // Calculate assigned shift dynamically for each employee based on THIS schedule
   const getEmployeeAssignedShift = (employeeId: string): ShiftType => {
     if (!localSchedule) return 'unassigned'
@@ -1134,7 +1165,7 @@ export default function GridView({ schedule, employees, onUpdate, branchCode, di
 
     // If no shifts in schedule, use employee's original assignedShift as fallback
     if (maxCount === 0) {
-      const employee = employees.find(emp => emp.id === employeeId)
+      const employee = employeeMap.get(employeeId)
       return employee?.assignedShift || 'unassigned'
     }
 
@@ -1192,7 +1223,12 @@ export default function GridView({ schedule, employees, onUpdate, branchCode, di
       if (!schedule || employees.length === 0) return
 
       let hasChanges = false
-      const updatedSchedule = { ...schedule }
+      // Copy days and shifts so the pushes/position edits below never touch the arrays
+      // localSchedule (and its memoized shiftLookup) still references
+      const updatedSchedule: Schedule = {
+        ...schedule,
+        days: schedule.days.map(day => ({ ...day, shifts: day.shifts.map(s => ({ ...s })) }))
+      }
 
       // Process each shift type separately
       const shiftTypes: ShiftType[] = ['morning', 'afternoon', 'night']
@@ -1228,11 +1264,13 @@ export default function GridView({ schedule, employees, onUpdate, branchCode, di
           }
         })
 
-        // Detect duplicates (excluding EXT) WITHIN THIS SHIFT
+        // Detect duplicates (excluding EXT) WITHIN THIS SHIFT, remembering who holds each position first
         const positionCounts = new Map<PositionType, number>()
-        employeePositions.forEach(pos => {
+        const firstHolderByPosition = new Map<PositionType, string>()
+        employeePositions.forEach((pos, id) => {
           if (pos !== 'EXT') {
             positionCounts.set(pos, (positionCounts.get(pos) || 0) + 1)
+            if (!firstHolderByPosition.has(pos)) firstHolderByPosition.set(pos, id)
           }
         })
 
@@ -1248,8 +1286,7 @@ export default function GridView({ schedule, employees, onUpdate, branchCode, di
             needsReassignment.push(employee.id)
           } else if (currentPos !== 'EXT' && (positionCounts.get(currentPos) || 0) > 1) {
             // Duplicate position (not EXT) - only reassign if this is not the first occurrence
-            const isFirstWithPosition = Array.from(employeePositions.entries())
-              .find(([id, pos]) => pos === currentPos)?.[0] === employee.id
+            const isFirstWithPosition = firstHolderByPosition.get(currentPos) === employee.id
 
             if (!isFirstWithPosition) {
               needsReassignment.push(employee.id)
@@ -1294,9 +1331,7 @@ export default function GridView({ schedule, employees, onUpdate, branchCode, di
             if (shiftIndex === -1) {
               // Create new shift for this employee
               // Use the standard start/end time for this shift type (from SHIFT_LABELS)
-              const { generateId } = require('@/lib/utils')
-              day.shifts.push({
-                id: generateId(),
+              day.shifts.push(createShift({
                 startTime,
                 endTime,
                 date: day.date,
@@ -1304,7 +1339,7 @@ export default function GridView({ schedule, employees, onUpdate, branchCode, di
                 isAssigned: true,
                 status: 'assigned',
                 position
-              })
+              }))
               hasChanges = true
             } else {
               // Update existing shift
@@ -1326,6 +1361,8 @@ export default function GridView({ schedule, employees, onUpdate, branchCode, di
 
       // Save changes if any were made
       if (hasChanges) {
+        // Update local state immediately so the grid (and shiftLookup) reflect the new assignments
+        setLocalSchedule(updatedSchedule)
         await storage.updateSchedule(schedule.id, updatedSchedule)
         onUpdate()
       }
@@ -1346,27 +1383,38 @@ export default function GridView({ schedule, employees, onUpdate, branchCode, di
     return () => document.removeEventListener('mouseup', handleMouseUp)
   }, [isSelecting])
 
-  // Get shift for a specific employee on a specific day and shift type
-  const getShiftForDay = useCallback((dayIndex: number, shiftType: ShiftType, employeeId?: string): import('@/types').Shift | undefined => {
-    if (!localSchedule) return undefined
-    const day = localSchedule.days[dayIndex]
-    if (!day) return undefined
-
-    // Use flexible matching based on shift type instead of exact time string
-    if (employeeId) {
-      return day.shifts.find(s => {
+  // Index shifts by day, shift type and employee once per schedule change.
+  // Every grid cell looks its shift up here, so this replaces a scan of the day's shifts per cell.
+  // Keys: `${dayIndex}|${shiftType}|${employeeId}` and `${dayIndex}|${shiftType}` (first shift of that type)
+  const shiftLookup = useMemo(() => {
+    const lookup = new Map<string, Shift>()
+    if (!localSchedule) return lookup
+
+    localSchedule.days.forEach((day, dayIndex) => {
+      day.shifts.forEach(s => {
+        // Use flexible matching based on shift type instead of exact time string
         const type = getShiftTypeFromTime(s.startTime, s.endTime)
-        return type === shiftType && s.employeeId === employeeId
-      })
-    }
+        if (!type) return
 
-    // Otherwise find any shift of that type (backwards compatibility)
-    return day.shifts.find(s => {
-      const type = getShiftTypeFromTime(s.startTime, s.endTime)
-      return type === shiftType
+        const typeKey = `${dayIndex}|${type}`
+        if (!lookup.has(typeKey)) lookup.set(typeKey, s)
+
+        if (s.employeeId) {
+          const employeeKey = `${typeKey}|${s.employeeId}`
+          if (!lookup.has(employeeKey)) lookup.set(employeeKey, s)
+        }
+      })
     })
+
+    return lookup
   }, [localSchedule])
 
+  // Get shift for a specific employee on a specific day and shift type
+  const getShiftForDay = useCallback((dayIndex: number, shiftType: ShiftType, employeeId?: string): Shift | undefined => {
+    // Without an employee, return any shift of that type (backwards compatibility)
+    return shiftLookup.get(employeeId ? `${dayIndex}|${shiftType}|${employeeId}` : `${dayIndex}|${shiftType}`)
+  }, [shiftLookup])
+
   const handleCellClick = useCallback((employeeId: string, dayIndex: number, shiftType: ShiftType, e?: React.MouseEvent) => {
     const cellKey = `${employeeId}-${dayIndex}-${shiftType}`
 
@@ -1537,15 +1585,14 @@ export default function GridView({ schedule, employees, onUpdate, branchCode, di
       })
 
       if (shiftIndex === -1) {
-        day.shifts.push({
-          id: generateId(),
+        day.shifts.push(createShift({
           startTime,
           endTime,
           date: day.date,
           employeeId,
           isAssigned: targetStatus === 'assigned',
           status: targetStatus
-        })
+        }))
         shiftIndex = day.shifts.length - 1
       }
 
@@ -1781,7 +1828,7 @@ export default function GridView({ schedule, employees, onUpdate, branchCode, di
   }
 
   const handleEmployeeTransfer = async (employeeId: string, targetBranch: BranchCode) => {
-    const employee = employees.find(emp => emp.id === employeeId)
+    const employee = employeeMap.get(employeeId)
     if (!employee) return
 
     // Update employee's branch
@@ -1790,7 +1837,7 @@ export default function GridView({ schedule, employees, onUpdate, branchCode, di
   }
 
   const handleEmployeeDeleteClick = (employeeId: string) => {
-    const employee = employees.find(emp => emp.id === employeeId)
+    const employee = employeeMap.get(employeeId)
     if (!employee) return
 
     // Open confirmation dialog
@@ -1933,7 +1980,6 @@ export default function GridView({ schedule, employees, onUpdate, branchCode, di
     // If employee had a previous shift assigned, move their individual shifts to the new shift type
     if (oldShiftType && oldShiftType !== 'unassigned' && oldShiftType !== newShiftType) {
       const updatedSchedule = JSON.parse(JSON.stringify(currentSchedule))
-      const { generateId } = require('@/lib/utils')
 
       // Determine available position for the new shift
       // Available positions pool - Turno 3 (night) does NOT have C1
@@ -1993,8 +2039,7 @@ export default function GridView({ schedule, employees, onUpdate, branchCode, di
             const [startTime, endTime] = newShiftConfig.time.split('-')
 
             // Create a new shift for this employee in the new shift type
-            const newShift = {
-              id: generateId(),
+            const newShift = createShift({
               startTime,
               endTime,
               date: day.date,
@@ -2003,7 +2048,7 @@ export default function GridView({ schedule, employees, onUpdate, branchCode, di
               status,
               coverageInfo,
               position: assignedPosition
-            }
+            })
             day.shifts.push(newShift)
           }
 
@@ -2164,16 +2209,14 @@ export default function GridView({ schedule, employees, onUpdate, branchCode, di
       })
 
       if (shiftIndex === -1) {
-        const { generateId } = require('@/lib/utils')
-        day.shifts.push({
-          id: generateId(),
+        day.shifts.push(createShift({
           startTime,
           endTime,
           date: day.date,
           employeeId,
           isAssigned: false,
           status: 'vacation'
-        })
+        }))
       } else {
         day.shifts[shiftIndex].status = 'vacation'
         day.shifts[shiftIndex].isAssigned = false
@@ -2330,23 +2373,23 @@ export default function GridView({ schedule, employees, onUpdate, branchCode, di
       if (isMultipleFiles) {
         if (successCount > 0 && failCount === 0) {
           if (importedScheduleNames.length > 0) {
-            const schedulesList = importedScheduleNames.map((name, i) => `<li>${name}</li>`).join('')
+            const schedulesList = importedScheduleNames.map(name => `<li>${escapeHtml(name)}</li>`).join('')
             showSuccessHtml(`Se importaron ${successCount} horario${successCount > 1 ? 's' : ''} correctamente:<br><br><ul style="text-align: left; margin: 10px 0;">${schedulesList}</ul>`, '¡Importación exitosa!')
           } else {
             showSuccess(`Se importaron ${successCount} horario${successCount > 1 ? 's' : ''} correctamente.`, '¡Importación exitosa!')
           }
         } else if (successCount > 0 && failCount > 0) {
-          const errorsList = errors.map(err => `<li>${err}</li>`).join('')
+          const errorsList = errors.map(err => `<li>${escapeHtml(err)}</li>`).join('')
           showWarningHtml(`<p>✅ ${successCount} horario${successCount > 1 ? 's' : ''} importado${successCount > 1 ? 's' : ''}</p><p>❌ ${failCount} falló${failCount > 1 ? ' fallaron' : ''}</p><br><strong>Errores:</strong><ul style="text-align: left; margin: 10px 0;">${errorsList}</ul>`)
         } else {
-          const errorsList = errors.map(err => `<li>${err}</li>`).join('')
+          const errorsList = errors.map(err => `<li>${escapeHtml(err)}</li>`).join('')
           showWarningHtml(`Todos los archivos fallaron:<br><br><ul style="text-align: left; margin: 10px 0;">${errorsList}</ul>`, '❌ Error de importación')
         }
       } else {
         // Single file mode
         if (importedScheduleNames.length > 1) {
           // Multi-schedule CSV in single file mode
-          const schedulesList = importedScheduleNames.map((name, i) => `<li>${name}</li>`).join('')
+          const schedulesList = importedScheduleNames.map(name => `<li>${escapeHtml(name)}</li>`).join('')
           showSuccessHtml(`Se importaron ${importedScheduleNames.length} horarios:<br><br><ul style="text-align: left; margin: 10px 0;">${schedulesList}</ul>`, '¡Importación exitosa!')
         } else if (importedScheduleNames.length === 1) {
           // Single schedule from multi-schedule CSV
@@ -2613,41 +2656,19 @@ export default function GridView({ schedule, employees, onUpdate, branchCode, di
       const rotateShiftAndPosition = (currentShift: ShiftType, currentPosition: PositionType): { shift: ShiftType; position: PositionType } => {
         // EXT employees rotate shift but keep EXT position
         if (currentPosition === 'EXT') {
-          const shiftRotation: Record<ShiftType, ShiftType> = {
-            'morning': 'afternoon',
-            'afternoon': 'night',
-            'night': 'morning',
-            'unassigned': 'unassigned'
-          }
-          return { shift: shiftRotation[currentShift], position: 'EXT' }
+          return { shift: EXT_SHIFT_ROTATION[currentShift], position: 'EXT' }
         }
 
         // Regular rotation with night shift special handling (only C2 and C3)
-        const rotation: Record<string, { shift: ShiftType; position: PositionType }> = {
-          // Morning rotations
-          'morning-C1': { shift: 'afternoon', position: 'C2' },
-          'morning-C2': { shift: 'afternoon', position: 'C3' },
-          'morning-C3': { shift: 'afternoon', position: 'C1' },
-          // Afternoon rotations (to night: no C1, use C2/C3)
-          'afternoon-C1': { shift: 'night', position: 'C2' },
-          'afternoon-C2': { shift: 'night', position: 'C3' },
-          'afternoon-C3': { shift: 'night', position: 'C2' },
-          // Night rotations (from night: C2↔C3, then to morning)
-          'night-C2': { shift: 'morning', position: 'C3' },
-          'night-C3': { shift: 'morning', position: 'C1' }
-        }
-
-        const key = `${currentShift}-${currentPosition}`
-        return rotation[key] || { shift: currentShift, position: currentPosition }
+        const rotated = SHIFT_POSITION_ROTATION[`${currentShift}-${currentPosition}`]
+        return rotated ? { ...rotated } : { shift: currentShift, position: currentPosition }
       }
 
       // Helper function to advance rest day by one day of week
       const advanceRestDay = (dayName: string): string => {
-        const days = ['Domingo', 'Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado']
-        const currentIndex = days.indexOf(dayName)
+        const currentIndex = DAY_NAMES.indexOf(dayName)
         if (currentIndex === -1) return dayName
-        const nextIndex = (currentIndex + 1) % days.length
-        return days[nextIndex]
+        return DAY_NAMES[(currentIndex + 1) % DAY_NAMES.length]
       }
 
       // Helper to get shift type from time
@@ -2705,19 +2726,10 @@ export default function GridView({ schedule, employees, onUpdate, branchCode, di
           // Calculate rotated shift and position
           const { shift: newShiftType, position: newPosition } = rotateShiftAndPosition(currentShiftType, currentPosition)
 
-          // Define shift times
-          const shiftTimes: Record<ShiftType, { start: string; end: string }> = {
-            'morning': { start: '06:00', end: '14:00' },
-            'afternoon': { start: '14:00', end: '22:00' },
-            'night': { start: '22:00', end: '06:00' },
-            'unassigned': { start: '', end: '' }
-          }
-
-          const targetTime = shiftTimes[newShiftType]
+          const targetTime = ROTATION_SHIFT_TIMES[newShiftType]
 
           // Create new shift object for this employee
-          const newShift = {
-            id: generateId(),
+          const newShift = createShift({
             startTime: targetTime.start,
             endTime: targetTime.end,
             date: newDay.date,
@@ -2725,8 +2737,8 @@ export default function GridView({ schedule, employees, onUpdate, branchCode, di
             isAssigned: true,
             position: newPosition,
             status: isRestDay ? ('rest' as ShiftStatus) : (prevShift.status === 'rest' ? 'assigned' as ShiftStatus : prevShift.status || 'assigned' as ShiftStatus),
-            ...(prevShift.coverageInfo && !isRestDay && { coverageInfo: { ...prevShift.coverageInfo } })
-          }
+            coverageInfo: prevShift.coverageInfo && !isRestDay ? { ...prevShift.coverageInfo } : undefined
+          })
 
           // Add to day's shifts
           newDay.shifts.push(newShift)
@@ -2750,13 +2762,15 @@ export default function GridView({ schedule, employees, onUpdate, branchCode, di
         return emp
       })
 
-      // Update each employee individually
-      for (const emp of updatedEmployees) {
-        const original = allEmployees.find(e => e.id === emp.id)
-        if (original && emp.shiftRotationCount !== original.shiftRotationCount) {
-          await storage.updateEmployee(emp.id, { shiftRotationCount: emp.shiftRotationCount })
-        }
-      }
+      // Update changed employees concurrently instead of one round-trip at a time
+      const originalMap = buildEmployeeMap(allEmployees)
+      const changedEmployees = updatedEmployees.filter(emp => {
+        const original = originalMap.get(emp.id)
+        return original && emp.shiftRotationCount !== original.shiftRotationCount
+      })
+      await Promise.all(changedEmployees.map(emp =>
+        storage.updateEmployee(emp.id, { shiftRotationCount: emp.shiftRotationCount })
+      ))
     }
 
     await storage.addSchedule(newSchedule)
@@ -4,7 +4,7 @@ import { useState, useRef } from 'react'
 import { Employee, Schedule, Shift, ShiftStatus } from '@/types'
 import { STATUS_CONFIG } from '@/lib/statusStyles'
 import { storage } from '@/lib/storage'
-import { formatTime, calculateShiftDuration } from '@/lib/utils'
+import { formatTime, calculateShiftDuration, buildEmployeeMap } from '@/lib/utils'
 import { User, Clock, Download, FileText } from 'lucide-react'
 // Heavy libs are lazy-loaded on demand to reduce initial bundle
 import { showError, showLoading, closeAlert, showSuccess } from '@/lib/sweetalert'
@@ -23,7 +23,7 @@ export default function ScheduleView({ schedule, employees, schedules, onSchedul
   const [selectedScheduleId, setSelectedScheduleId] = useState(schedule?.id || '')
   const scheduleRef = useRef<HTMLDivElement>(null)
 
-  const employeeMap = new Map(employees.map(emp => [emp.id, emp]))
+  const employeeMap = buildEmployeeMap(employees)
 
   const handleScheduleChange = (scheduleId: string) => {
     setSelectedScheduleId(scheduleId)
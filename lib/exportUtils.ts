@@ -6,7 +6,7 @@
 import type { Schedule, Employee, Shift, PositionType } from '@/types'
 import type { ParsedCSVData } from '@/lib/csvParser'
 import { showWarningHtml } from '@/lib/sweetalert'
-import { getShiftTypeFromTime } from '@/lib/utils'
+import { generateId, getShiftTypeFromTime, buildEmployeeMap, createShift, escapeHtml, parseLocalDate, DAY_NAMES } from '@/lib/utils'
 
 /**
  * Normalize a time string to HH:MM (e.g., 7 -> 07:00, 7:0 -> 07:00, 07.00 -> 07:00)
@@ -100,6 +100,48 @@ function extractPositionFromName(fullName: string): { baseName: string; position
   }
 }
 
+/**
+ * Build an employee lookup for CSV rows, indexing names once instead of scanning
+ * (and re-lowercasing) the whole employee list for every row.
+ * Matching order: exact base name, case-insensitive, trimmed case-insensitive,
+ * then the full original name (backward compatibility). First employee wins on ties.
+ */
+function buildEmployeeNameLookup(employees: Employee[]): (baseName: string, originalName: string) => Employee | undefined {
+  const byName = new Map<string, Employee>()
+  const byLowerName = new Map<string, Employee>()
+  const byTrimmedLowerName = new Map<string, Employee>()
+
+  employees.forEach(emp => {
+    const lower = emp.name.toLowerCase()
+    const trimmedLower = emp.name.trim().toLowerCase()
+    if (!byName.has(emp.name)) byName.set(emp.name, emp)
+    if (!byLowerName.has(lower)) byLowerName.set(lower, emp)
+    if (!byTrimmedLowerName.has(trimmedLower)) byTrimmedLowerName.set(trimmedLower, emp)
+  })
+
+  return (baseName: string, originalName: string) => {
+    let employee = byName.get(baseName)
+    if (!employee && baseName) {
+      employee = byLowerName.get(baseName.toLowerCase()) || byTrimmedLowerName.get(baseName.trim().toLowerCase())
+    }
+    if (!employee && originalName) {
+      employee = byTrimmedLowerName.get(originalName.trim().toLowerCase())
+    }
+    return employee
+  }
+}
+
+/**
+ * Index schedule days by date so each CSV row resolves its day in O(1) (first day wins on duplicates)
+ */
+function buildDayByDate(days: Schedule['days']): Map<string, Schedule['days'][number]> {
+  const dayByDate = new Map<string, Schedule['days'][number]>()
+  days.forEach(day => {
+    if (!dayByDate.has(day.date)) dayByDate.set(day.date, day)
+  })
+  return dayByDate
+}
+
 export async function exportToPDF(
   element: HTMLElement,
   filename: string
@@ -154,6 +196,45 @@ export function exportToJSON(data: any, filename: string): void {
   }
 }
 
+/**
+ * Quote a CSV value when it contains commas
+ */
+function escapeCSVValue(value: string): string {
+  return value.includes(',') ? `"${value}"` : value
+}
+
+/**
+ * Build the CSV line for a single shift (shared by the single and multi-schedule exports)
+ */
+function formatShiftCSVRow(shift: Shift, dayName: string, employeeName: string): string {
+  const horario = `${shift.startTime}-${shift.endTime}`
+
+  // Determine shift name using robust detection (supports alias times like 06-14)
+  const detected = getShiftTypeFromTime(shift.startTime, shift.endTime)
+  // Handle unassigned or null
+  const shiftName = detected === 'morning'
+    ? 'TURNO 1'
+    : detected === 'afternoon'
+    ? 'TURNO 2'
+    : detected === 'night'
+    ? 'TURNO 3'
+    : horario
+
+  // Coverage columns are only filled when status is 'covering'
+  const coverage = shift.status === 'covering' ? shift.coverageInfo : undefined
+
+  return escapeCSVValue(shift.date) + ',' +
+    escapeCSVValue(dayName) + ',' +
+    escapeCSVValue(shiftName) + ',' +
+    escapeCSVValue(horario) + ',' +
+    escapeCSVValue(employeeName) + ',' +
+    escapeCSVValue(shift.position || '') + ',' +
+    escapeCSVValue(shift.status || 'empty') + ',' +
+    escapeCSVValue(coverage?.type || '') + ',' +
+    escapeCSVValue(coverage?.targetBranch || '') + ',' +
+    escapeCSVValue(coverage?.targetShift || '')
+}
+
 /**
  * Export schedule to CSV format
  *
@@ -181,54 +262,12 @@ export function exportToCSV(
 
     // Build CSV rows
     const rows: string[] = [headers.join(',')]
+    const employeeMap = buildEmployeeMap(employees)
 
     schedule.days.forEach(day => {
       day.shifts.forEach(shift => {
-        // Find employee name
-        const employee = employees.find(emp => emp.id === shift.employeeId)
-        const employeeName = employee?.name || ''
-
-        // Determine shift name using robust detection (supports alias times like 06-14)
-        const detected = getShiftTypeFromTime(shift.startTime, shift.endTime)
-        // Handle unassigned or null
-        const shiftName = detected === 'morning'
-          ? 'TURNO 1'
-          : detected === 'afternoon'
-          ? 'TURNO 2'
-          : detected === 'night'
-          ? 'TURNO 3'
-          : `${shift.startTime}-${shift.endTime}`
-
-        // Extract coverage info if status is 'covering'
-        let coverageType = ''
-        let coverageBranch = ''
-        let coverageShift = ''
-
-        if (shift.status === 'covering' && shift.coverageInfo) {
-          coverageType = shift.coverageInfo.type || ''
-          coverageBranch = shift.coverageInfo.targetBranch || ''
-          coverageShift = shift.coverageInfo.targetShift || ''
-        }
-
-        const row = [
-          shift.date,
-          day.dayName,
-          shiftName,
-          `${shift.startTime}-${shift.endTime}`,
-          employeeName,
-          shift.position || '',
-          shift.status || 'empty',
-          coverageType,
-          coverageBranch,
-          coverageShift
-        ]
-
-        // Escape commas in values by quoting them
-        const escapedRow = row.map(value =>
-          value.includes(',') ? `"${value}"` : value
-        )
-
-        rows.push(escapedRow.join(','))
+        const employeeName = (shift.employeeId && employeeMap.get(shift.employeeId)?.name) || ''
+        rows.push(formatShiftCSVRow(shift, day.dayName, employeeName))
       })
     })
 
@@ -236,8 +275,8 @@ export function exportToCSV(
 
     const csvContent = rows.join('\n')
 
-    // Add UTF-8 BOM for Excel compatibility
-    const blob = new Blob(['\ufeff' + csvContent], { type: 'text/csv;charset=utf-8;' })
+    // Add UTF-8 BOM for Excel compatibility (as a separate Blob part to avoid copying the whole CSV string)
+    const blob = new Blob(['\ufeff', csvContent], { type: 'text/csv;charset=utf-8;' })
     const url = URL.createObjectURL(blob)
     const link = document.createElement('a')
     link.href = url
@@ -273,56 +312,17 @@ export function exportAllSchedulesToCSV(
     // CSV Headers
     const headers = ['Fecha', 'Día', 'Turno', 'Horario', 'Empleado', 'Posición', 'Estado', 'CoverageTipo', 'CoverageSucursal', 'CoverageTurno', 'NombreHorario']
     const rows: string[] = [headers.join(',')]
+    const employeeMap = buildEmployeeMap(employees)
 
     // Process each schedule
     schedules.forEach(schedule => {
+      // Schedule name column identifies which schedule each shift belongs to
+      const scheduleNameColumn = ',' + escapeCSVValue(schedule.name)
+
       schedule.days.forEach(day => {
         day.shifts.forEach(shift => {
-          // Find employee name
-          const employee = employees.find(emp => emp.id === shift.employeeId)
-          const employeeName = employee?.name || ''
-
-          // Determine shift name using robust detection (supports alias times like 06-14)
-          const detected = getShiftTypeFromTime(shift.startTime, shift.endTime)
-          const shiftName = detected === 'morning'
-            ? 'TURNO 1'
-            : detected === 'afternoon'
-            ? 'TURNO 2'
-            : detected === 'night'
-            ? 'TURNO 3'
-            : `${shift.startTime}-${shift.endTime}`
-
-          // Extract coverage info if status is 'covering'
-          let coverageType = ''
-          let coverageBranch = ''
-          let coverageShift = ''
-
-          if (shift.status === 'covering' && shift.coverageInfo) {
-            coverageType = shift.coverageInfo.type || ''
-            coverageBranch = shift.coverageInfo.targetBranch || ''
-            coverageShift = shift.coverageInfo.targetShift || ''
-          }
-
-          const row = [
-            shift.date,
-            day.dayName,
-            shiftName,
-            `${shift.startTime}-${shift.endTime}`,
-            employeeName,
-            shift.position || '',
-            shift.status || 'empty',
-            coverageType,
-            coverageBranch,
-            coverageShift,
-            schedule.name // Add schedule name to identify which schedule this shift belongs to
-          ]
-
-          // Escape commas in values by quoting them
-          const escapedRow = row.map(value =>
-            value.includes(',') ? `"${value}"` : value
-          )
-
-          rows.push(escapedRow.join(','))
+          const employeeName = (shift.employeeId && employeeMap.get(shift.employeeId)?.name) || ''
+          rows.push(formatShiftCSVRow(shift, day.dayName, employeeName) + scheduleNameColumn)
         })
       })
     })
@@ -331,8 +331,8 @@ export function exportAllSchedulesToCSV(
 
     const csvContent = rows.join('\n')
 
-    // Add UTF-8 BOM for Excel compatibility
-    const blob = new Blob(['\ufeff' + csvContent], { type: 'text/csv;charset=utf-8;' })
+    // Add UTF-8 BOM for Excel compatibility (as a separate Blob part to avoid copying the whole CSV string)
+    const blob = new Blob(['\ufeff', csvContent], { type: 'text/csv;charset=utf-8;' })
     const url = URL.createObjectURL(blob)
     const link = document.createElement('a')
     link.href = url
@@ -358,7 +358,7 @@ function analyzeScheduleDateRange(dates: string[]): string {
 
   // Parse dates and get day numbers
   const days = dates.map(dateStr => {
-    const date = new Date(dateStr + 'T00:00:00')
+    const date = parseLocalDate(dateStr)
     return date.getDate()
   })
 
@@ -481,7 +481,7 @@ export function importAllSchedulesFromCSV(
 
           // Get day numbers from dates
           const days = dates.map(dateStr => {
-            const date = new Date(dateStr + 'T00:00:00')
+            const date = parseLocalDate(dateStr)
             return date.getDate()
           })
 
@@ -505,12 +505,12 @@ export function importAllSchedulesFromCSV(
 
             // Split rows into two groups
             const firstHalfRows = rows.filter(row => {
-              const date = new Date(row.date + 'T00:00:00')
+              const date = parseLocalDate(row.date)
               return date.getDate() <= 15
             })
 
             const secondHalfRows = rows.filter(row => {
-              const date = new Date(row.date + 'T00:00:00')
+              const date = parseLocalDate(row.date)
               return date.getDate() >= 16
             })
 
@@ -546,9 +546,9 @@ export function importAllSchedulesFromCSV(
 
         console.log('[importAllSchedulesFromCSV] 📊 After quincenal analysis:', improvedScheduleGroups.size, 'schedule(s):', Array.from(improvedScheduleGroups.keys()))
 
-        const { generateId } = require('@/lib/utils')
         const createdSchedules: Schedule[] = []
         const employeesNotFound: Set<string> = new Set()
+        const findEmployeeByName = buildEmployeeNameLookup(employees)
 
         // Create a schedule for each group
         let totalInvalidHorarioCount = 0
@@ -579,12 +579,11 @@ export function importAllSchedulesFromCSV(
 
           // Create days for each unique date
           scheduleDates.forEach((date: string) => {
-            const dateObj = new Date(date + 'T00:00:00')
-            const dayName = dateObj.toLocaleDateString('es-ES', { weekday: 'long' })
+            const dateObj = parseLocalDate(date)
 
             schedule.days.push({
               date,
-              dayName: dayName.charAt(0).toUpperCase() + dayName.slice(1),
+              dayName: DAY_NAMES[dateObj.getDay()],
               shifts: []
             })
           })
@@ -593,8 +592,10 @@ export function importAllSchedulesFromCSV(
           let shiftsCreated = 0
           let coverageInfoRestored = 0
 
+          const dayByDate = buildDayByDate(schedule.days)
+
           rows.forEach(row => {
-            const day = schedule.days.find(d => d.date === row.date)
+            const day = dayByDate.get(row.date)
             if (!day) {
               console.warn(`[importAllSchedulesFromCSV] ⚠️ Day not found for date: ${row.date}`)
               return
@@ -621,23 +622,7 @@ export function importAllSchedulesFromCSV(
             const extractedPosition = nameInfo.position
 
             // Find employee
-            let employee = employees.find(emp => emp.name === baseName)
-            if (!employee && baseName) {
-              employee = employees.find(emp =>
-                emp.name.toLowerCase() === baseName.toLowerCase()
-              )
-            }
-            if (!employee && baseName) {
-              const trimmedBaseName = baseName.trim()
-              employee = employees.find(emp =>
-                emp.name.trim().toLowerCase() === trimmedBaseName.toLowerCase()
-              )
-            }
-            if (!employee && row.employeeName) {
-              employee = employees.find(emp =>
-                emp.name.trim().toLowerCase() === row.employeeName.trim().toLowerCase()
-              )
-            }
+            const employee = findEmployeeByName(baseName, row.employeeName)
 
             // Reconstruct coverageInfo
             let coverageInfo = undefined
@@ -670,8 +655,7 @@ export function importAllSchedulesFromCSV(
             const finalPosition = extractedPosition || (row.position as PositionType) || undefined
 
             // Create shift
-            const shift = {
-              id: generateId(),
+            const shift = createShift({
               startTime,
               endTime,
               date: row.date,
@@ -680,7 +664,7 @@ export function importAllSchedulesFromCSV(
               position: finalPosition,
               status: row.status as any || 'empty',
               coverageInfo
-            }
+            })
 
             if (row.employeeName && !employee) {
               employeesNotFound.add(row.employeeName)
@@ -702,7 +686,7 @@ export function importAllSchedulesFromCSV(
           const notFoundList = Array.from(employeesNotFound).join(', ')
           console.warn('[importAllSchedulesFromCSV] ⚠️ Empleados no encontrados:', notFoundList)
           if (!silentMode) {
-            const employeesList = Array.from(employeesNotFound).map(name => `<li>${name}</li>`).join('')
+            const employeesList = Array.from(employeesNotFound).map(name => `<li>${escapeHtml(name)}</li>`).join('')
             showWarningHtml(`Los siguientes empleados del CSV no se encontraron en tu lista:<br><br><ul style="text-align: left; margin: 10px 0;">${employeesList}</ul><br>Sus turnos se importaron pero sin empleado asignado.`, '⚠️ Empleados no encontrados')
           }
         }
@@ -733,6 +717,7 @@ export function importAllSchedulesFromCSV(
 
         // Update each employee's assignedShift
         let employeesUpdated = 0
+        const employeeMap = buildEmployeeMap(employees)
         employeeShiftCounts.forEach((shiftCounts, employeeId) => {
           let maxCount = 0
           let primaryShift = 'morning'
@@ -744,7 +729,7 @@ export function importAllSchedulesFromCSV(
             }
           })
 
-          const employee = employees.find(e => e.id === employeeId)
+          const employee = employeeMap.get(employeeId)
           if (employee && employee.assignedShift !== primaryShift) {
             const { storage } = require('@/lib/storage')
             storage.updateEmployee(employeeId, { ...employee, assignedShift: primaryShift as any })
@@ -824,7 +809,6 @@ export function importFromCSV(
           console.warn('[importFromCSV] ⚠️ Parsing errors:', parsedData.errors)
         }
 
-        const { generateId } = require('@/lib/utils')
         let updatedSchedule: Schedule
 
         if (currentSchedule) {
@@ -845,7 +829,7 @@ export function importFromCSV(
           console.log('[importFromCSV] 📅 Date range:', startDate, 'to', endDate)
 
           // Determine schedule name based on dates
-          const startDateObj = new Date(startDate + 'T00:00:00')
+          const startDateObj = parseLocalDate(startDate)
           const scheduleName = `Horario ${startDateObj.toLocaleString('es-ES', { month: 'long', year: 'numeric' })}`
 
           // Create new schedule structure with ALL required fields
@@ -863,12 +847,11 @@ export function importFromCSV(
 
           // Create days for each unique date in CSV
           parsedData.dates.forEach((date: string) => {
-            const dateObj = new Date(date + 'T00:00:00')
-            const dayName = dateObj.toLocaleDateString('es-ES', { weekday: 'long' })
+            const dateObj = parseLocalDate(date)
 
             updatedSchedule.days.push({
               date,
-              dayName: dayName.charAt(0).toUpperCase() + dayName.slice(1),
+              dayName: DAY_NAMES[dateObj.getDay()],
               shifts: []
             })
           })
@@ -883,9 +866,12 @@ export function importFromCSV(
         let employeesNotFound: Set<string> = new Set()
         let invalidHorarioCount = 0
 
+        const dayByDate = buildDayByDate(updatedSchedule.days)
+        const findEmployeeByName = buildEmployeeNameLookup(employees)
+
         parsedData.rows.forEach(row => {
           // Find the day
-          const day = updatedSchedule.days.find(d => d.date === row.date)
+          const day = dayByDate.get(row.date)
           if (!day) {
             console.warn(`[importFromCSV] ⚠️ Day not found for date: ${row.date}`)
             return
@@ -917,30 +903,8 @@ export function importFromCSV(
           }
 
           // Find employee by base name with flexible matching
-          // 1. Try exact match with base name
-          let employee = employees.find(emp => emp.name === baseName)
-
-          // 2. Try case-insensitive match
-          if (!employee && baseName) {
-            employee = employees.find(emp =>
-              emp.name.toLowerCase() === baseName.toLowerCase()
-            )
-          }
-
-          // 3. Try trimmed match
-          if (!employee && baseName) {
-            const trimmedBaseName = baseName.trim()
-            employee = employees.find(emp =>
-              emp.name.trim().toLowerCase() === trimmedBaseName.toLowerCase()
-            )
-          }
-
-          // 4. If still not found, try matching with full original name (backward compatibility)
-          if (!employee && row.employeeName) {
-            employee = employees.find(emp =>
-              emp.name.trim().toLowerCase() === row.employeeName.trim().toLowerCase()
-            )
-          }
+          // (exact, case-insensitive, trimmed, then full original name for backward compatibility)
+          const employee = findEmployeeByName(baseName, row.employeeName)
 
           // Reconstruct coverageInfo from CSV columns if status is 'covering'
           let coverageInfo = undefined
@@ -980,8 +944,7 @@ export function importFromCSV(
 
           // Create NEW shift for each CSV row (don't search for existing)
           // This respects the architecture: 1 shift = 1 employee assignment
-          const shift = {
-            id: generateId(),
+          const shift = createShift({
             startTime,
             endTime,
             date: row.date,
@@ -990,7 +953,7 @@ export function importFromCSV(
             position: finalPosition,
             status: row.status as any || 'empty',
             coverageInfo
-          }
+          })
 
           // Track employees not found
           if (row.employeeName && !employee) {
@@ -1014,7 +977,7 @@ export function importFromCSV(
           const notFoundList = Array.from(employeesNotFound).join(', ')
           console.warn('[importFromCSV] ⚠️ Empleados no encontrados:', notFoundList)
           if (!silentMode) {
-            const employeesList = Array.from(employeesNotFound).map(name => `<li>${name}</li>`).join('')
+            const employeesList = Array.from(employeesNotFound).map(name => `<li>${escapeHtml(name)}</li>`).join('')
             showWarningHtml(`Los siguientes empleados del CSV no se encontraron en tu lista:<br><br><ul style="text-align: left; margin: 10px 0;">${employeesList}</ul><br>Sus turnos se importaron pero sin empleado asignado. Por favor, verifica los nombres de empleados.`, '⚠️ Empleados no encontrados')
           }
         }
@@ -1044,6 +1007,7 @@ export function importFromCSV(
         // Update each employee's assignedShift to their most common shift
         let employeesUpdated = 0
         let employeesAnalyzed = 0
+        const employeeMap = buildEmployeeMap(employees)
         employeeShiftCounts.forEach((shiftCounts, employeeId) => {
           let maxCount = 0
           let primaryShift = 'morning'
@@ -1055,7 +1019,7 @@ export function importFromCSV(
             }
           })
 
-          const employee = employees.find(e => e.id === employeeId)
+          const employee = employeeMap.get(employeeId)
           if (employee) {
             employeesAnalyzed++
             console.log(`[importFromCSV] 📊 ${employee.name}: ${maxCount} shifts in ${primaryShift}, current assignedShift=${employee.assignedShift}`)
@@ -218,10 +218,14 @@ export const hybridEmployeeStorage = {
    * Elimina un empleado
    */
   async delete(id: string): Promise<void> {
-    // 1. Eliminar del caché
+    // 1. Eliminar del caché (en sitio; solo reescribe si el empleado existía)
     const cache = readFromCache<Employee>(EMPLOYEES_KEY)
-    const filtered = cache.filter(emp => emp.id !== id)
-    writeToCache(EMPLOYEES_KEY, filtered)
+    const index = cache.findIndex(emp => emp.id === id)
+
+    if (index !== -1) {
+      cache.splice(index, 1)
+      writeToCache(EMPLOYEES_KEY, cache)
+    }
 
     // 2. Intentar sincronizar
     const isOnline = await checkConnection()
@@ -363,10 +367,14 @@ export const hybridScheduleStorage = {
    * Elimina un horario
    */
   async delete(id: string): Promise<void> {
-    // 1. Eliminar del caché
+    // 1. Eliminar del caché (en sitio; solo reescribe si el horario existía)
     const cache = readFromCache<Schedule>(SCHEDULES_KEY)
-    const filtered = cache.filter(sch => sch.id !== id)
-    writeToCache(SCHEDULES_KEY, filtered)
+    const index = cache.findIndex(sch => sch.id === id)
+
+    if (index !== -1) {
+      cache.splice(index, 1)
+      writeToCache(SCHEDULES_KEY, cache)
+    }
 
     // 2. Intentar sincronizar
     const isOnline = await checkConnection()
@@ -25,6 +25,10 @@ export interface QueuedOperation {
  * Sistema de cola para operaciones pendientes
  */
 class SyncQueue {
+  // Última cola serializada y su versión parseada, para no repetir JSON.parse si no cambió
+  private cachedRaw: string | null = null
+  private cachedQueue: QueuedOperation[] = []
+
   /**
    * Obtiene todas las operaciones pendientes
    */
@@ -33,7 +37,11 @@ class SyncQueue {
 
     try {
       const stored = localStorage.getItem(QUEUE_KEY)
-      return stored ? JSON.parse(stored) : []
+      if (stored !== this.cachedRaw) {
+        this.cachedQueue = stored ? JSON.parse(stored) : []
+        this.cachedRaw = stored
+      }
+      return this.cachedQueue.slice()
     } catch (error) {
       console.error('Error reading sync queue:', error)
       return []
@@ -47,7 +55,10 @@ class SyncQueue {
     if (typeof window === 'undefined') return
 
     try {
-      localStorage.setItem(QUEUE_KEY, JSON.stringify(queue))
+      const raw = JSON.stringify(queue)
+      localStorage.setItem(QUEUE_KEY, raw)
+      this.cachedRaw = raw
+      this.cachedQueue = queue.slice()
     } catch (error) {
       console.error('Error saving sync queue:', error)
     }
@@ -1,6 +1,25 @@
-import { format, addDays } from 'date-fns'
 import { Employee, Schedule, ScheduleDay, Shift, ShiftTemplate, DayOfWeek, ShiftType } from '@/types'
 
+// Spanish day names indexed like Date#getDay (0 = Sunday); shared so every ScheduleDay reuses the same strings
+export const DAY_NAMES: readonly string[] = ['Domingo', 'Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado']
+
+// Weekday index (0 = Sunday, same as Date#getDay) for Spanish and legacy English day names.
+// A Map so inherited keys like "constructor" never resolve to a weekday.
+export const WEEKDAY_INDEX: ReadonlyMap<string, number> = new Map<string, number>([
+  ['Domingo', 0], ['Lunes', 1], ['Martes', 2], ['Miércoles', 3], ['Jueves', 4], ['Viernes', 5], ['Sábado', 6],
+  ['Sunday', 0], ['Monday', 1], ['Tuesday', 2], ['Wednesday', 3], ['Thursday', 4], ['Friday', 5], ['Saturday', 6],
+])
+
+// 7-bit availability mask: bit WEEKDAY_INDEX.get(day) is set for each available day
+export function getAvailabilityMask(availableDays: string[]): number {
+  let mask = 0
+  availableDays.forEach(day => {
+    const weekday = WEEKDAY_INDEX.get(day)
+    if (weekday !== undefined) mask |= 1 << weekday
+  })
+  return mask
+}
+
 export function generateId(): string {
   // Prefer cryptographically strong UUID v4 when available
   try {
@@ -24,12 +43,54 @@ export function isUuid(value: string | undefined | null): boolean {
   return /^[0-9a-f]{8}-[0-9a-f]{4}-[1-5][0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}$/i.test(value)
 }
 
+const HTML_ESCAPES: Record<string, string> = {
+  '&': '&amp;',
+  '<': '&lt;',
+  '>': '&gt;',
+  '"': '&quot;',
+  "'": '&#39;'
+}
+
+// Escape text interpolated into alert HTML; most names have no special characters, so skip the replace for those
+export function escapeHtml(text: string): string {
+  if (!/[&<>"']/.test(text)) return text
+  return text.replace(/[&<>"']/g, ch => HTML_ESCAPES[ch])
+}
+
+// Create a Shift with every field initialized in a fixed order so all shift
+// objects share the same shape (keeps property access monomorphic in loops)
+export function createShift(fields: Omit<Shift, 'id'> & { id?: string }): Shift {
+  return {
+    id: fields.id || generateId(),
+    startTime: fields.startTime,
+    endTime: fields.endTime,
+    date: fields.date,
+    employeeId: fields.employeeId,
+    isAssigned: fields.isAssigned,
+    status: fields.status,
+    coverageInfo: fields.coverageInfo,
+    position: fields.position
+  }
+}
+
+// Index employees by id so loops can resolve them with a single Map lookup
+export function buildEmployeeMap(employees: Employee[]): Map<string, Employee> {
+  return new Map(employees.map(emp => [emp.id, emp] as [string, Employee]))
+}
+
 // Parse date string in local timezone to avoid timezone issues
 export function parseLocalDate(dateStr: string): Date {
   const [year, month, day] = dateStr.split('-').map(Number)
   return new Date(year, month - 1, day)
 }
 
+// Format a Date as YYYY-MM-DD in local time (fixed pattern, no format-string parsing)
+export function toLocalDateString(date: Date): string {
+  const month = date.getMonth() + 1
+  const day = date.getDate()
+  return `${date.getFullYear()}-${month < 10 ? '0' : ''}${month}-${day < 10 ? '0' : ''}${day}`
+}
+
 export function formatTime(time: string): string {
   try {
     const [hours, minutes] = time.split(':')
@@ -62,16 +123,19 @@ export function calculateShiftDuration(startTime: string, endTime: string): numb
 }
 
 // Helper function to determine shift type from time
-export function getShiftTypeFromTime(startTime: string, endTime: string): ShiftType | null {
-  const time = `${startTime}-${endTime}`
-  if (time === '06:00-14:00') return 'morning'
-  if (time === '14:00-22:00') return 'afternoon'
-  if (time === '22:00-06:00') return 'night'
+// Shift bucket by "start-end" time range; one lookup instead of a chain of comparisons
+const SHIFT_TYPE_BY_TIME: Record<string, ShiftType> = {
+  '06:00-14:00': 'morning',
+  '14:00-22:00': 'afternoon',
+  '22:00-06:00': 'night',
   // Tolerate legacy canonical times from older schedules
-  if (time === '07:00-15:00') return 'morning'
-  if (time === '15:00-23:00') return 'afternoon'
-  if (time === '23:00-07:00') return 'night'
-  return null
+  '07:00-15:00': 'morning',
+  '15:00-23:00': 'afternoon',
+  '23:00-07:00': 'night'
+}
+
+export function getShiftTypeFromTime(startTime: string, endTime: string): ShiftType | null {
+  return SHIFT_TYPE_BY_TIME[`${startTime}-${endTime}`] || null
 }
 
 export function generateWeeklySchedule(
@@ -84,9 +148,6 @@ export function generateWeeklySchedule(
   const start = new Date(year, month - 1, day) // month is 0-indexed
   const startDay = start.getDate()
 
-  const days: ScheduleDay[] = []
-  const dayNames = ['Domingo', 'Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado']
-
   // Determine if this is first half (1-15) or second half (16-end)
   let numDays: number
   let endDate: Date
@@ -103,37 +164,47 @@ export function generateWeeklySchedule(
   } else {
     // Default to 15 days for any other start date
     numDays = 15
-    endDate = addDays(start, 14)
+    endDate = new Date(year, month - 1, day + 14)
   }
 
-  for (let i = 0; i < numDays; i++) {
-    const currentDate = addDays(start, i)
-    const dayIndex = currentDate.getDay()
-    const dayName = dayNames[dayIndex]
-    const dateStr = format(currentDate, 'yyyy-MM-dd')
+  // Group templates by day once instead of filtering the full list for every day
+  const templatesByDay = new Map<string, ShiftTemplate[]>()
+  templates.forEach(template => {
+    const group = templatesByDay.get(template.dayOfWeek)
+    if (group) {
+      group.push(template)
+    } else {
+      templatesByDay.set(template.dayOfWeek, [template])
+    }
+  })
+
+  // Build all days in one pass at their final length
+  const days: ScheduleDay[] = Array.from({ length: numDays }, (_, i) => {
+    // The Date constructor rolls day overflow into the next month
+    const currentDate = new Date(year, month - 1, day + i)
+    const dayName = DAY_NAMES[currentDate.getDay()]
+    const dateStr = toLocalDateString(currentDate)
 
-    const dayTemplates = templates.filter(t => t.dayOfWeek === dayName)
-    const shifts: Shift[] = dayTemplates.map(template => ({
-      id: generateId(),
+    const shifts: Shift[] = (templatesByDay.get(dayName) || []).map(template => createShift({
       startTime: template.startTime,
       endTime: template.endTime,
       date: dateStr,
       isAssigned: false,
-      status: 'empty' as const
+      status: 'empty'
     }))
 
-    days.push({
+    return {
       date: dateStr,
       dayName,
       shifts
-    })
-  }
+    }
+  })
 
   return {
     id: generateId(),
     name,
-    startDate: format(start, 'yyyy-MM-dd'),
-    endDate: format(endDate, 'yyyy-MM-dd'),
+    startDate: toLocalDateString(start),
+    endDate: toLocalDateString(endDate),
     days,
     createdAt: new Date().toISOString(),
     updatedAt: new Date().toISOString()